@@ -1,15 +1,38 @@
+from contextlib import asynccontextmanager
 from typing import Annotated, Optional
 
-from fastapi import Depends, FastAPI, HTTPException, Query, APIRouter
+from fastapi import Body, Depends, FastAPI, HTTPException, Query, APIRouter, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse  # Serialización JSON en C (orjson)
 from fastapi.security.api_key import APIKeyHeader # Necesaria para la seguridad
-from sqlmodel import Field, Session, SQLModel, create_engine, select
-from sqlalchemy.engine.base import Engine  # Necesario Engine
+from pydantic import ConfigDict
+from sqlmodel import Field, SQLModel, select
+from sqlmodel.ext.asyncio.session import AsyncSession  # Sesión asíncrona con .exec()
+from sqlalchemy import Index, bindparam, delete, insert, update
+from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+import functools
+import hashlib
+import hmac
 import os
-
-# --- 1. Definición de Modelos (Sin Cambios) ---
+import redis.asyncio as redis
+from redis.exceptions import RedisError
+from starlette.datastructures import Headers, MutableHeaders
+
+# --- 1. Definición de Modelos ---
+# Los modelos son planos. Si se añaden relaciones (p. ej. Heroe.equipo_id), declararlas con
+# Relationship(sa_relationship_kwargs={"lazy": "raise"}) y cargarlas en los listados con
+# select(...).options(selectinload(...)): una consulta por relación en lugar de N+1, y la
+# sesión asíncrona no puede hacer cargas perezosas de todos modos.
 ID_FIELD = Field(default=None, primary_key=True, sa_column_kwargs={"autoincrement": True})
 
 class Heroe(SQLModel, table=True):
+    # Para búsquedas por nombre + edad. Los listados actuales (select de todas las columnas,
+    # ORDER BY id) usan la clave primaria; ningún índice los cubre. Cada índice extra tiene
+    # un coste en cada INSERT/UPDATE.
+    __table_args__ = (
+        Index("ix_heroe_nombre_edad", "nombre", "edad"),
+    )
+
     id: Optional[int] = ID_FIELD
     nombre: str = Field(index=True)
     edad: Optional[int] = Field(default=None, index=True)
@@ -25,6 +48,35 @@ class Equipo(SQLModel, table=True):
 class Villano(SQLModel, table=True):
     id: Optional[int] = ID_FIELD
     nombre_villano: str = Field(index=True)
+    amenaza_nivel: int = Field(index=True)
+    ultima_ubicacion: Optional[str] = None
+
+
+# --- 1.1 Esquemas de Lectura (Respuestas) ---
+# Solo exponen los campos públicos y se construyen desde los objetos ORM (from_attributes),
+# así la respuesta no filtra `nombre_secreto`.
+
+class HeroeRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+    id: int
+    nombre: str
+    edad: Optional[int] = None
+    poder: Optional[str] = None
+
+class EquipoRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+    id: int
+    nombre_equipo: str
+    base_operaciones: str
+    fundacion_anio: int
+
+class VillanoRead(SQLModel):
+    model_config = ConfigDict(from_attributes=True, extra="ignore")
+
+    id: int
+    nombre_villano: str
     amenaza_nivel: int
     ultima_ubicacion: Optional[str] = None
 
@@ -34,43 +86,98 @@ class Villano(SQLModel, table=True):
 ## Variables de entorno
 DATABASE_URL = os.environ.get("DATABASE_URL")
 API_CLAVE_SECRETA = os.environ.get("API_CLAVE_SECRETA")
+# Se codifica una sola vez para no hacerlo en cada petición (None = ninguna clave es válida).
+API_CLAVE_SECRETA_BYTES = API_CLAVE_SECRETA.encode() if API_CLAVE_SECRETA else None
+REDIS_URL = os.environ.get("REDIS_URL")  # Opcional: sin ella la caché queda desactivada
 print("DATABASE_URL:", DATABASE_URL)
 
 # 1. Validación de la URL: Si no está en el entorno (Render/Docker), fallamos inmediatamente.
 if not DATABASE_URL:
     raise Exception(f"La variable de entorno DATABASE_URL no está configurada. {DATABASE_URL}")
 
-# 2. Variable global para el motor (Inicialmente None, se llena en el startup)
-motor_db: Engine | None = None
+# 2. El motor asíncrono usa el driver asyncpg en lugar de psycopg2.
+DATABASE_URL_ASYNC = DATABASE_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+# 3. Tamaño del pool de conexiones (por proceso/worker).
+#    Cada worker de Uvicorn crea su propio pool: WEB_CONCURRENCY * (POOL_SIZE + POOL_MAX_OVERFLOW)
+#    debe mantenerse por debajo de max_connections de Postgres (100 por defecto).
+#    Con los valores por defecto: 4 workers * (10 + 5) = 60 conexiones como máximo.
+POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", "10"))
+POOL_MAX_OVERFLOW = int(os.environ.get("DB_POOL_MAX_OVERFLOW", "5"))
+POOL_RECYCLE_SEGUNDOS = int(os.environ.get("DB_POOL_RECYCLE", "1800"))
+POOL_TIMEOUT_SEGUNDOS = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
 
+# Máximo de elementos por petición en los endpoints /bulk (acota el tamaño de la transacción).
+MAX_LOTE = 1000
 
-def crear_db_y_tablas():
+# 4. Variable global para el motor (Inicialmente None, se llena al arrancar en ciclo_de_vida)
+motor_db: AsyncEngine | None = None
+
+# 5. Cliente de Redis para la caché de listados (solo si REDIS_URL está configurada)
+cliente_redis: redis.Redis | None = None
+
+
+async def crear_db_y_tablas():
     """Crea la base de datos y todas las tablas definidas."""
     if motor_db is None:
         raise Exception("El motor de la base de datos no se ha inicializado correctamente.")
-    SQLModel.metadata.create_all(motor_db)
+    # create_all es síncrono: run_sync lo ejecuta sobre la conexión asíncrona.
+    async with motor_db.begin() as conn:
+        await conn.run_sync(SQLModel.metadata.create_all)
 
 
-def obtener_sesion():
+async def obtener_sesion():
     if motor_db is None:
         raise Exception("El motor de la base de datos no se ha inicializado.")
-    with Session(motor_db) as sesion:
+    async with AsyncSession(motor_db, expire_on_commit=False) as sesion:
         yield sesion
 
 
-SesionDep = Annotated[Session, Depends(obtener_sesion)]
+SesionDep = Annotated[AsyncSession, Depends(obtener_sesion)]
+
+
+@functools.lru_cache(maxsize=64)
+def _sentencia_update(modelo: type[SQLModel], campos: frozenset[str]):
+    """UPDATE ... RETURNING parametrizado, cacheado por modelo y conjunto de campos."""
+    # Los bindparam llevan prefijo: SQLAlchemy reserva el nombre de la columna para el SET.
+    return (
+        update(modelo)
+        .where(modelo.id == bindparam("id_objetivo"))
+        .values({campo: bindparam(f"v_{campo}") for campo in campos})
+        .returning(modelo)
+    )
+
+# --- 2.1 Mensajes de Error ---
+# Solo se comparten los textos: cada `raise` crea su propia HTTPException, porque una
+# instancia compartida acumula __traceback__ (y retiene sesiones/peticiones) en cada raise.
+DETALLE_401 = "Acceso Denegado: Clave API inválida o faltante."
+DETALLE_HEROE_404 = "Héroe no encontrado"
+DETALLE_EQUIPO_404 = "Equipo no encontrado"
+DETALLE_VILLANO_404 = "Villano no encontrado"
+
 
-# --- 2.1 Configuración de Autenticación (Dependencia) ---
+def _no_encontrado(detail: str) -> HTTPException:
+    return HTTPException(status_code=404, detail=detail)
+
+# --- 2.2 Configuración de Autenticación (Dependencia) ---
 
 api_key_header_auth = APIKeyHeader(name="X-API-Key", auto_error=False)
 
 
-def verificar_acceso(api_key: str = Depends(api_key_header_auth)):
+@functools.lru_cache(maxsize=16)
+def _clave_valida(api_key: str) -> bool:
+    """Resultado memorizado por valor de cabecera; el tamaño acotado evita que claves
+    aleatorias hagan crecer la memoria."""
+    if API_CLAVE_SECRETA_BYTES is None:
+        return False
+    # compare_digest compara en tiempo constante: no filtra cuántos bytes coinciden.
+    return hmac.compare_digest(api_key.encode(), API_CLAVE_SECRETA_BYTES)
+
+
+async def verificar_acceso(api_key: str = Depends(api_key_header_auth)):
     """Verifica si la clave enviada por el cliente coincide con la clave secreta."""
-    if api_key is None or api_key != API_CLAVE_SECRETA:
-        raise HTTPException(
-            status_code=401, detail="Acceso Denegado: Clave API inválida o faltante."
-        )
+    if not api_key or not _clave_valida(api_key):
+        raise HTTPException(status_code=401, detail=DETALLE_401)
     return True
 
 # 1. Creamos el objeto Depends() para la inicialización global
@@ -78,8 +185,39 @@ DEPENDENCIA_GLOBAL_SEGURA = Depends(verificar_acceso)
 
 # --- 3. Inicialización de la Aplicación FastAPI (Con Dependencias Globales) ---
 
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    """Crea el motor de la DB y las tablas al arrancar; libera las conexiones al apagar."""
+    global motor_db, cliente_redis
+    
+    # 🚨 FIX: La conexión se crea aquí, después de que la red de Docker esté lista.
+    motor_db = create_async_engine(
+        DATABASE_URL_ASYNC,
+        pool_size=POOL_SIZE,
+        max_overflow=POOL_MAX_OVERFLOW,
+        pool_pre_ping=True,  # Descarta conexiones muertas tras reinicios de la DB
+        pool_recycle=POOL_RECYCLE_SEGUNDOS,
+        pool_timeout=POOL_TIMEOUT_SEGUNDOS,
+        connect_args={
+            "ssl": "require"  # asyncpg usa "ssl" en lugar de "sslmode"
+        }
+    )
+    await crear_db_y_tablas() # Crea todas las tablas en la nueva DB
+
+    if REDIS_URL:
+        cliente_redis = redis.from_url(REDIS_URL)
+
+    yield
+
+    if cliente_redis is not None:
+        await cliente_redis.aclose()
+    await motor_db.dispose()
+
+
 app = FastAPI(
     title="API CRUD de Héroes, Equipos y Villanos",
+    default_response_class=ORJSONResponse,
+    lifespan=ciclo_de_vida,
     dependencies=[DEPENDENCIA_GLOBAL_SEGURA] # <--- ¡APLICACIÓN GLOBAL DE SEGURIDAD!
 )
 
@@ -87,154 +225,323 @@ router_heroes = APIRouter(prefix="/heroes", tags=["Heroe"])
 router_equipos = APIRouter(prefix="/equipos", tags=["Equipo"])
 router_villanos = APIRouter(prefix="/villanos", tags=["Villano"])
 
-@app.on_event("startup")
-def al_iniciar():
-    """Crea el motor de la DB y las tablas cuando la aplicación está lista."""
-    global motor_db
-    
-    # 🚨 FIX: La conexión se crea aquí, después de que la red de Docker esté lista.
-    motor_db = create_engine(
-        DATABASE_URL,
-        connect_args={
-            "sslmode": "require"
-        }
-    )
-    crear_db_y_tablas() # Crea todas las tablas en la nueva DB
+# --- 3.1 Caché de Respuestas (Redis) ---
+# Los listados se guardan en Redis por ruta + query + clave API. Cada recurso tiene un
+# contador de versión: un POST/PATCH/DELETE lo incrementa y las entradas viejas dejan de
+# leerse (y caducan solas por TTL).
+# Un HIT se sirve antes de que corra verificar_acceso, así que la clave se revalida aquí:
+# tras rotar API_CLAVE_SECRETA la clave vieja deja de recibir listados de inmediato.
+# El middleware solo se registra si REDIS_URL está configurada (en Vercel no hay Redis).
+
+CACHE_TTL_SEGUNDOS = 60
+RUTAS_CACHEABLES = {"/heroes/", "/equipos/", "/villanos/"}
+METODOS_ESCRITURA = {"POST", "PATCH", "PUT", "DELETE"}
+
+
+def _recurso_de(ruta: str) -> str:
+    """'/heroes/5' -> 'heroes'."""
+    return ruta.strip("/").split("/", 1)[0]
+
+
+async def _clave_cache(recurso: str, ruta: str, query: bytes, api_key: str) -> str:
+    version = await cliente_redis.get(f"cache:{recurso}:version") or b"0"
+    huella = hashlib.sha256(f"{ruta}?{query.decode()}|{api_key}".encode()).hexdigest()
+    return f"cache:{recurso}:{version.decode()}:{huella}"
+
+
+class CacheDeRespuestas:
+    """Middleware ASGI: sirve los listados desde Redis e invalida el recurso en escrituras.
+
+    El resto de peticiones pasa directo a la aplicación, sin re-empaquetar la respuesta.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or cliente_redis is None:
+            await self.app(scope, receive, send)
+            return
+
+        metodo, ruta = scope["method"], scope["path"]
+        if metodo in METODOS_ESCRITURA:
+            await self._escritura(scope, receive, send)
+        elif metodo == "GET" and ruta in RUTAS_CACHEABLES:
+            await self._listado(scope, receive, send)
+        else:
+            await self.app(scope, receive, send)
+
+    async def _escritura(self, scope, receive, send):
+        recurso = _recurso_de(scope["path"])
+
+        async def enviar(mensaje):
+            # Se invalida antes de responder: el cliente no puede leer un listado viejo
+            # justo después de recibir la confirmación de su escritura.
+            if mensaje["type"] == "http.response.start" and mensaje["status"] < 400:
+                try:
+                    await cliente_redis.incr(f"cache:{recurso}:version")
+                except RedisError:
+                    pass
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+    async def _listado(self, scope, receive, send):
+        headers = Headers(scope=scope)
+        api_key = headers.get("x-api-key")
+        if not api_key or not _clave_valida(api_key):
+            await self.app(scope, receive, send)  # verificar_acceso responde el 401
+            return
+
+        sin_cache = "no-cache" in headers.get("cache-control", "")
+        try:
+            clave = await _clave_cache(
+                _recurso_de(scope["path"]), scope["path"], scope["query_string"], api_key
+            )
+            cuerpo = None if sin_cache else await cliente_redis.get(clave)
+        except RedisError:
+            await self.app(scope, receive, send)  # Redis caído: se responde desde la DB
+            return
+
+        if cuerpo is not None:
+            respuesta = Response(
+                content=cuerpo, media_type="application/json", headers={"X-Cache": "HIT"}
+            )
+            await respuesta(scope, receive, send)
+            return
+
+        estado = None
+        partes: list[bytes] = []
+
+        async def enviar(mensaje):
+            nonlocal estado
+            if mensaje["type"] == "http.response.start":
+                estado = mensaje["status"]
+                MutableHeaders(scope=mensaje)["X-Cache"] = "MISS"
+            elif mensaje["type"] == "http.response.body" and estado == 200:
+                partes.append(mensaje.get("body", b""))
+                if not mensaje.get("more_body", False):
+                    try:
+                        await cliente_redis.set(clave, b"".join(partes), ex=CACHE_TTL_SEGUNDOS)
+                    except RedisError:
+                        pass
+            await send(mensaje)
+
+        await self.app(scope, receive, enviar)
+
+
+if REDIS_URL:
+    app.add_middleware(CacheDeRespuestas)
+
+# Registrado después de la caché para quedar por fuera de ella: Redis guarda el JSON sin
+# comprimir y la compresión se negocia por cliente según Accept-Encoding. Como la caché es
+# ASGI pura (no re-empaqueta el cuerpo), minimum_size se respeta: las respuestas pequeñas
+# salen sin comprimir y con Content-Length. Nivel 6: casi la misma tasa que 9 con menos CPU.
+app.add_middleware(GZipMiddleware, minimum_size=500, compresslevel=6)
+
+# --- 3.2 ETags para lecturas individuales ---
+
+def _etag_de(cuerpo: bytes) -> str:
+    """ETag débil estable entre workers (hash del JSON serializado)."""
+    return f'W/"{hashlib.sha256(cuerpo).hexdigest()[:32]}"'
+
+
+def _etag_coincide(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    candidatos = {valor.strip() for valor in if_none_match.split(",")}
+    return "*" in candidatos or etag in candidatos
+
 
 @app.get("/", tags=["Diagnostico"])
-def estado_salud():
+async def estado_salud():
     return {"status": "OK", "mensaje": "🦸‍♀️ API de Héroes, Equipos y Villanos funcionando correctamente."}
+
+
 # --- 4. Endpoints CRUD para Héroes (Heroe) ---
 # Todos requieren seguridad gracias a la configuración global
 
-@router_heroes.post("/", response_model=Heroe)
-def crear_heroe(heroe: Heroe, sesion: SesionDep) -> Heroe:
+@router_heroes.post("/", response_model=HeroeRead)
+async def crear_heroe(heroe: Heroe, sesion: SesionDep) -> Heroe:
     sesion.add(heroe)
-    sesion.commit()
-    sesion.refresh(heroe)
+    await sesion.commit()
+    await sesion.refresh(heroe)
     return heroe
 
-@router_heroes.get("/", response_model=list[Heroe])
-def leer_heroes(
+@router_heroes.post("/bulk", response_model=list[HeroeRead])
+async def crear_heroes(
+    items: Annotated[list[Heroe], Body(max_length=MAX_LOTE)], sesion: SesionDep
+) -> list[Heroe]:
+    # Un solo INSERT ... RETURNING y un solo commit para todo el lote.
+    if not items:
+        return []
+    filas = [item.model_dump(exclude={"id"}) for item in items]
+    # sort_by_parameter_order: los ids devueltos respetan el orden de `items`.
+    stmt = insert(Heroe).returning(Heroe, sort_by_parameter_order=True)
+    creados = (await sesion.exec(stmt, params=filas)).scalars().all()
+    await sesion.commit()
+    return creados
+
+@router_heroes.get("/", response_model=list[HeroeRead])
+async def leer_heroes(
     sesion: SesionDep,
     desplazamiento: int = 0,
     limite: Annotated[int, Query(le=100)] = 100,
 ) -> list[Heroe]:
-    heroes = sesion.exec(select(Heroe).offset(desplazamiento).limit(limite)).all()
+    heroes = (await sesion.exec(select(Heroe).order_by(Heroe.id).offset(desplazamiento).limit(limite))).all()
     return heroes
 
-@router_heroes.get("/{heroe_id}", response_model=Heroe)
-def leer_heroe(heroe_id: int, sesion: SesionDep) -> Heroe:
-    heroe = sesion.get(Heroe, heroe_id)
+@router_heroes.get("/{heroe_id}", response_model=HeroeRead)
+async def leer_heroe(heroe_id: int, sesion: SesionDep, request: Request) -> Response:
+    heroe = await sesion.get(Heroe, heroe_id)
     if not heroe:
-        raise HTTPException(status_code=404, detail="Héroe no encontrado")
-    return heroe
-
-@router_heroes.patch("/{heroe_id}", response_model=Heroe)
-def actualizar_heroe(heroe_id: int, heroe: Heroe, sesion: SesionDep) -> Heroe:
-    db_heroe = sesion.get(Heroe, heroe_id)
+        raise _no_encontrado(DETALLE_HEROE_404)
+    # Se valida y serializa una sola vez: el mismo JSON sirve para el ETag y el cuerpo
+    # (al devolver un Response, FastAPI no vuelve a pasar por response_model).
+    cuerpo = HeroeRead.model_validate(heroe).model_dump_json().encode()
+    etag = _etag_de(cuerpo)
+    if _etag_coincide(request, etag):
+        return Response(status_code=304, headers={"ETag": etag})  # El cliente ya lo tiene
+    return Response(content=cuerpo, media_type="application/json", headers={"ETag": etag})
+
+@router_heroes.patch("/{heroe_id}", response_model=HeroeRead)
+async def actualizar_heroe(heroe_id: int, heroe: Heroe, sesion: SesionDep) -> Heroe:
+    # Un único UPDATE ... RETURNING en lugar de SELECT + UPDATE + SELECT.
+    campos = frozenset(heroe.model_fields_set - {"id"})
+    if campos:
+        parametros = {f"v_{campo}": getattr(heroe, campo) for campo in campos}
+        parametros["id_objetivo"] = heroe_id
+        resultado = await sesion.exec(_sentencia_update(Heroe, campos), params=parametros)
+        db_heroe = resultado.scalar_one_or_none()
+        await sesion.commit()
+    else:
+        db_heroe = await sesion.get(Heroe, heroe_id)  # Nada que actualizar
     if not db_heroe:
-        raise HTTPException(status_code=404, detail="Héroe no encontrado")
-
-    heroe_datos = heroe.model_dump(exclude_unset=True)
-    for key, value in heroe_datos.items():
-        setattr(db_heroe, key, value)
-    # db_heroe.model_validate(db_heroe, update=heroe_datos)
-
-    sesion.add(db_heroe)
-    sesion.commit()
-    sesion.expire(db_heroe)
-    sesion.refresh(db_heroe)
+        raise _no_encontrado(DETALLE_HEROE_404)
     return db_heroe
 
 @router_heroes.delete("/{heroe_id}")
-def eliminar_heroe(heroe_id: int, sesion: SesionDep):
-    heroe = sesion.get(Heroe, heroe_id)
-    if not heroe:
-        raise HTTPException(status_code=404, detail="Héroe no encontrado")
-    sesion.delete(heroe)
-    sesion.commit()
+async def eliminar_heroe(heroe_id: int, sesion: SesionDep):
+    resultado = await sesion.exec(delete(Heroe).where(Heroe.id == heroe_id))
+    await sesion.commit()
+    if resultado.rowcount == 0:
+        raise _no_encontrado(DETALLE_HEROE_404)
     return {"ok": True}
 
 
 # --- 5. Endpoints CRUD para Equipos (Equipo) ---
 # ... (Los demás endpoints siguen el mismo patrón limpio) ...
 
-@router_equipos.post("/", response_model=Equipo)
-def crear_equipo(equipo: Equipo, sesion: SesionDep) -> Equipo:
+@router_equipos.post("/", response_model=EquipoRead)
+async def crear_equipo(equipo: Equipo, sesion: SesionDep) -> Equipo:
     sesion.add(equipo)
-    sesion.commit()
-    sesion.refresh(equipo)
+    await sesion.commit()
+    await sesion.refresh(equipo)
     return equipo
 
-@router_equipos.get("/", response_model=list[Equipo])
-def leer_equipos(sesion: SesionDep) -> list[Equipo]:
-    equipos = sesion.exec(select(Equipo)).all()
+@router_equipos.post("/bulk", response_model=list[EquipoRead])
+async def crear_equipos(
+    items: Annotated[list[Equipo], Body(max_length=MAX_LOTE)], sesion: SesionDep
+) -> list[Equipo]:
+    # Un solo INSERT ... RETURNING y un solo commit para todo el lote.
+    if not items:
+        return []
+    filas = [item.model_dump(exclude={"id"}) for item in items]
+    # sort_by_parameter_order: los ids devueltos respetan el orden de `items`.
+    stmt = insert(Equipo).returning(Equipo, sort_by_parameter_order=True)
+    creados = (await sesion.exec(stmt, params=filas)).scalars().all()
+    await sesion.commit()
+    return creados
+
+@router_equipos.get("/", response_model=list[EquipoRead])
+async def leer_equipos(
+    sesion: SesionDep,
+    desplazamiento: int = 0,
+    limite: Annotated[int, Query(le=100)] = 100,
+) -> list[Equipo]:
+    equipos = (await sesion.exec(select(Equipo).order_by(Equipo.id).offset(desplazamiento).limit(limite))).all()
     return equipos
 
-@router_equipos.patch("/{equipo_id}", response_model=Equipo)
-def actualizar_equipo(equipo_id: int, equipo: Equipo, sesion: SesionDep) -> Equipo:
-    db_equipo = sesion.get(Equipo, equipo_id)
+@router_equipos.patch("/{equipo_id}", response_model=EquipoRead)
+async def actualizar_equipo(equipo_id: int, equipo: Equipo, sesion: SesionDep) -> Equipo:
+    # Un único UPDATE ... RETURNING en lugar de SELECT + UPDATE + SELECT.
+    campos = frozenset(equipo.model_fields_set - {"id"})
+    if campos:
+        parametros = {f"v_{campo}": getattr(equipo, campo) for campo in campos}
+        parametros["id_objetivo"] = equipo_id
+        resultado = await sesion.exec(_sentencia_update(Equipo, campos), params=parametros)
+        db_equipo = resultado.scalar_one_or_none()
+        await sesion.commit()
+    else:
+        db_equipo = await sesion.get(Equipo, equipo_id)  # Nada que actualizar
     if not db_equipo:
-        raise HTTPException(status_code=404, detail="Equipo no encontrado")
-
-    equipo_datos = equipo.model_dump(exclude_unset=True)
-    for key, value in equipo_datos.items():
-        setattr(db_equipo, key, value)
-
-    sesion.add(db_equipo)
-    sesion.commit()
-    sesion.expire(db_equipo)
-    sesion.refresh(db_equipo)
+        raise _no_encontrado(DETALLE_EQUIPO_404)
     return db_equipo
 
 @router_equipos.delete("/{equipo_id}")
-def eliminar_equipo(equipo_id: int, sesion: SesionDep):
-    equipo = sesion.get(Equipo, equipo_id)
-    if not equipo:
-        raise HTTPException(status_code=404, detail="Equipo no encontrado")
-    sesion.delete(equipo)
-    sesion.commit()
+async def eliminar_equipo(equipo_id: int, sesion: SesionDep):
+    resultado = await sesion.exec(delete(Equipo).where(Equipo.id == equipo_id))
+    await sesion.commit()
+    if resultado.rowcount == 0:
+        raise _no_encontrado(DETALLE_EQUIPO_404)
     return {"ok": True}
 
 
 # --- 6. Endpoints CRUD para Villanos (Villano) ---
 
-@router_villanos.post("/", response_model=Villano)
-def crear_villano(villano: Villano, sesion: SesionDep) -> Villano:
+@router_villanos.post("/", response_model=VillanoRead)
+async def crear_villano(villano: Villano, sesion: SesionDep) -> Villano:
     sesion.add(villano)
-    sesion.commit()
-    sesion.refresh(villano)
+    await sesion.commit()
+    await sesion.refresh(villano)
     return villano
 
-@router_villanos.get("/", response_model=list[Villano])
-def leer_villanos(sesion: SesionDep) -> list[Villano]:
-    villanos = sesion.exec(select(Villano)).all()
+@router_villanos.post("/bulk", response_model=list[VillanoRead])
+async def crear_villanos(
+    items: Annotated[list[Villano], Body(max_length=MAX_LOTE)], sesion: SesionDep
+) -> list[Villano]:
+    # Un solo INSERT ... RETURNING y un solo commit para todo el lote.
+    if not items:
+        return []
+    filas = [item.model_dump(exclude={"id"}) for item in items]
+    # sort_by_parameter_order: los ids devueltos respetan el orden de `items`.
+    stmt = insert(Villano).returning(Villano, sort_by_parameter_order=True)
+    creados = (await sesion.exec(stmt, params=filas)).scalars().all()
+    await sesion.commit()
+    return creados
+
+@router_villanos.get("/", response_model=list[VillanoRead])
+async def leer_villanos(
+    sesion: SesionDep,
+    desplazamiento: int = 0,
+    limite: Annotated[int, Query(le=100)] = 100,
+) -> list[Villano]:
+    villanos = (await sesion.exec(select(Villano).order_by(Villano.id).offset(desplazamiento).limit(limite))).all()
     return villanos
 
-@router_villanos.patch("/{villano_id}", response_model=Villano)
-def actualizar_villano(villano_id: int, villano: Villano, sesion: SesionDep) -> Villano:
-    db_villano = sesion.get(Villano, villano_id)
+@router_villanos.patch("/{villano_id}", response_model=VillanoRead)
+async def actualizar_villano(villano_id: int, villano: Villano, sesion: SesionDep) -> Villano:
+    # Un único UPDATE ... RETURNING en lugar de SELECT + UPDATE + SELECT.
+    campos = frozenset(villano.model_fields_set - {"id"})
+    if campos:
+        parametros = {f"v_{campo}": getattr(villano, campo) for campo in campos}
+        parametros["id_objetivo"] = villano_id
+        resultado = await sesion.exec(_sentencia_update(Villano, campos), params=parametros)
+        db_villano = resultado.scalar_one_or_none()
+        await sesion.commit()
+    else:
+        db_villano = await sesion.get(Villano, villano_id)  # Nada que actualizar
     if not db_villano:
-        raise HTTPException(status_code=404, detail="Villano no encontrado")
-
-    villano_datos = villano.model_dump(exclude_unset=True)
-    for key, value in villano_datos.items():
-        setattr(db_villano, key, value)
-
-    sesion.add(db_villano)
-    sesion.commit()
-    sesion.expire(db_villano)
-    sesion.refresh(db_villano)
+        raise _no_encontrado(DETALLE_VILLANO_404)
     return db_villano
 
 @router_villanos.delete("/{villano_id}")
-def eliminar_villano(villano_id: int, sesion: SesionDep):
-    villano = sesion.get(Villano, villano_id)
-    if not villano:
-        raise HTTPException(status_code=404, detail="Villano no encontrado")
-    sesion.delete(villano)
-    sesion.commit()
+async def eliminar_villano(villano_id: int, sesion: SesionDep):
+    resultado = await sesion.exec(delete(Villano).where(Villano.id == villano_id))
+    await sesion.commit()
+    if resultado.rowcount == 0:
+        raise _no_encontrado(DETALLE_VILLANO_404)
     return {"ok": True}
 
 